@@ -5,17 +5,25 @@ import json
 import time
 import tempfile
 import platform
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Tuple, Optional
 
+# Let libvips use the available cores unless VIPS_CONCURRENCY is already set.
+# libvips only reads it when it initializes, i.e. when pyvips is imported.
+os.environ.setdefault("VIPS_CONCURRENCY", str(min(os.cpu_count() or 1, 16)))
+
 try:
     import numpy as np
     import cv2
     import pyvips
     import openslide
-    from PIL import Image
     import tifffile
-    from shapely.geometry import shape
+    import imagecodecs
+    import shapely
+    from numba import njit, prange
     from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
     from rich.console import Console
     from rich.panel import Panel
@@ -30,16 +38,176 @@ except ImportError as e:
 # Enable pyvips cache tracing for debugging
 # pyvips.cache_set_trace(True)  # Disabled for clean output
 
+
+@njit(cache=True)
+def _build_edge_table(xs, ys, starts):
+    """
+    Build the scanline edge table of the rings whose vertices are xs[starts[r]:starts[r + 1]],
+    ys[...], as flat arrays (y_min, y_max, x_at_y_min, inv_slope, edge_starts) with edges
+    grouped per ring
+    """
+    n_rings = starts.shape[0] - 1
+    y_min = np.empty(xs.shape[0], np.float64)
+    y_max = np.empty(xs.shape[0], np.float64)
+    x_at_y_min = np.empty(xs.shape[0], np.float64)
+    inv_slope = np.empty(xs.shape[0], np.float64)
+    edge_starts = np.empty(n_rings + 1, np.int64)
+    
+    n_edges = 0
+    for r in range(n_rings):
+        edge_starts[r] = n_edges
+        first, last = starts[r], starts[r + 1]
+        for i in range(first, last):
+            # Each vertex starts an edge to the next one, the last vertex closes its ring
+            j = i + 1 if i + 1 < last else first
+            x1, y1, x2, y2 = xs[i], ys[i], xs[j], ys[j]
+            
+            # Horizontal edges never cross a scanline
+            if y1 == y2:
+                continue
+            if y1 > y2:
+                x1, y1, x2, y2 = x2, y2, x1, y1
+            y_min[n_edges] = y1
+            y_max[n_edges] = y2
+            x_at_y_min[n_edges] = x1
+            inv_slope[n_edges] = (x2 - x1) / (y2 - y1)
+            n_edges += 1
+    edge_starts[n_rings] = n_edges
+    
+    return (y_min[:n_edges], y_max[:n_edges], x_at_y_min[:n_edges],
+            inv_slope[:n_edges], edge_starts)
+
+
+@njit(inline="always")
+def _set_bit_range(words, lo, hi):
+    """Set bits lo to hi - 1 of a row of bit-packed uint64 words (bit i of word w is pixel 64w+i)"""
+    all_ones = np.uint64(0xFFFFFFFFFFFFFFFF)
+    first, last = lo >> 6, (hi - 1) >> 6
+    head = all_ones << np.uint64(lo & 63)
+    tail = all_ones >> np.uint64(63 - ((hi - 1) & 63))
+    if first == last:
+        words[first] |= head & tail
+    else:
+        words[first] |= head
+        words[first + 1:last] = all_ones
+        words[last] |= tail
+
+
+@njit(parallel=True, cache=True)
+def _scanline_fill(y_min, y_max, x_at_y_min, inv_slope, edge_starts, polygon_ids,
+                   x0, y0, out):
+    """
+    Fill the given polygons into the bit-packed tile out, of shape (rows, words),
+    whose top-left pixel is (x0, y0).
+    Each polygon is filled even-odd on its own, overlapping polygons are merged.
+    """
+    height, width = out.shape[0], out.shape[1] * 64
+    n_polygons = polygon_ids.shape[0]
+    
+    # Keep only the edges spanning this tile's rows, still grouped per polygon
+    n_edges = 0
+    for k in range(n_polygons):
+        n_edges += edge_starts[polygon_ids[k] + 1] - edge_starts[polygon_ids[k]]
+    active = np.empty(n_edges, np.int64)
+    active_starts = np.zeros(n_polygons + 1, np.int64)
+    first_row, last_row = y0 + 0.5, y0 + height - 0.5
+    n_active = 0
+    max_edges = 1
+    for k in range(n_polygons):
+        p = polygon_ids[k]
+        for e in range(edge_starts[p], edge_starts[p + 1]):
+            if y_min[e] <= last_row and y_max[e] > first_row:
+                active[n_active] = e
+                n_active += 1
+        active_starts[k + 1] = n_active
+        max_edges = max(max_edges, n_active - active_starts[k])
+    
+    crossings = np.empty((height, max_edges), np.float64)
+    for row in prange(height):
+        y = y0 + row + 0.5
+        xs = crossings[row]
+        for k in range(n_polygons):
+            # Intersect the scanline with the polygon, keeping xs sorted
+            n = 0
+            for i in range(active_starts[k], active_starts[k + 1]):
+                e = active[i]
+                if y_min[e] <= y and y < y_max[e]:
+                    x = x_at_y_min[e] + (y - y_min[e]) * inv_slope[e]
+                    j = n
+                    while j > 0 and xs[j - 1] > x:
+                        xs[j] = xs[j - 1]
+                        j -= 1
+                    xs[j] = x
+                    n += 1
+            
+            # Fill the pixels whose centers fall between pairs of crossings
+            for j in range(0, n - 1, 2):
+                lo = max(int(np.ceil(xs[j] - 0.5)) - x0, 0)
+                hi = min(int(np.ceil(xs[j + 1] - 0.5)) - x0, width)
+                if lo < hi:
+                    _set_bit_range(out[row], lo, hi)
+
 class UnifiedTissueExtractionPipeline:
     """Unified pipeline for tissue extraction from SVS files"""
     
-    def __init__(self, keep_intermediates: bool = True, compression: str = 'lzw'):
+    # Tile size of the RGBA output; levels are written one tile at a time
+    OUTPUT_TILE_SIZE = 256
+    
+    # TIFF compressions whose tiles are plain compressed bytes, so they can be
+    # encoded in worker threads before being handed to tifffile
+    TILE_ENCODERS = {
+        'none': lambda tile: tile.tobytes(),
+        'lzw': imagecodecs.lzw_encode,
+        'zlib': imagecodecs.deflate_encode,
+        'deflate': imagecodecs.deflate_encode,
+        'adobe_deflate': imagecodecs.deflate_encode,
+        'lzma': imagecodecs.lzma_encode,
+        'zstd': imagecodecs.zstd_encode,
+    }
+    
+    # libvips names of the TIFF compressions the default (libvips) output path
+    # accepts; JPEG is left out as it cannot store the alpha channel
+    VIPS_COMPRESSIONS = {
+        'none': 'none',
+        'lzw': 'lzw',
+        'zlib': 'deflate',
+        'deflate': 'deflate',
+        'adobe_deflate': 'deflate',
+        'zstd': 'zstd',
+    }
+    
+    # Lossless compressions that get the horizontal differencing predictor:
+    # neighbouring tissue pixels are close, so their differences compress better
+    PREDICTOR_COMPRESSIONS = {'lzw', 'zlib', 'deflate', 'adobe_deflate', 'lzma', 'zstd'}
+    
+    def __init__(self, keep_intermediates: bool = True, compression: str = 'zstd',
+                 select_levels: bool = False):
         self.keep_intermediates = keep_intermediates
         self.compression = compression
+        self.select_levels = select_levels
+        
+        # Every pyvips operation here runs once on a whole slide, caching them
+        # only pins large intermediate images in memory
+        pyvips.cache_set_max(0)
+        
+        # SVS opened once and shared by the conversion and mask stages
+        self._svs_path = None
+        self._svs_img = None
+        
+        # GeoJSON rings read once and shared by the mask and extraction stages
+        self._geojson_path = None
+        self._annotations = None
         
         # Detect if we can use colors
         self.use_colors = self._can_use_colors()
         self.console = Console(force_terminal=True, color_system="auto" if self.use_colors else None)
+        
+        # The libvips writer of the default output path depends on libtiff's ZSTD
+        # support (missing from the pip libvips wheels), check it before any work
+        if (not self.select_levels and (self.compression or '').lower() == 'zstd'
+                and not self._vips_supports_compression('zstd')):
+            self.log_warning("libvips has no ZSTD TIFF support, using LZW compression")
+            self.compression = 'lzw'
     
     def _can_use_colors(self) -> bool:
         """Detect if terminal supports colors"""
@@ -97,8 +265,16 @@ class UnifiedTissueExtractionPipeline:
             print("─" * 50)
     
     def print_summary(self, total_time: float, svs_size: float, output_size: float, 
-                     output_path: str, tissue_tiff_path: str, mask_tiff_path: str):
+                     output_path: str, tissue_tiff_path: Optional[str] = None,
+                     mask_tiff_path: Optional[str] = None):
         """Print final summary with fallback for no colors"""
+        files = [f"• Final output: {output_path}"]
+        if tissue_tiff_path is not None:
+            files.append(f"• Tissue TIFF: {tissue_tiff_path}")
+        if mask_tiff_path is not None:
+            files.append(f"• Mask TIFF: {mask_tiff_path}")
+        files = "\n".join(files)
+        
         if self.use_colors:
             self.console.print(Panel.fit(
                 f"""[green]✓ Pipeline completed successfully![/green]
@@ -110,9 +286,7 @@ class UnifiedTissueExtractionPipeline:
 • Compression ratio: {output_size/svs_size:.2f}x
 
 📁 [bold]Files:[/bold]
-• Final output: {output_path}
-• Tissue TIFF: {tissue_tiff_path}
-• Mask TIFF: {mask_tiff_path}
+{files}
 
 🎨 [bold]Output format:[/bold]
 • RGBA pyramidal TIFF
@@ -132,9 +306,7 @@ class UnifiedTissueExtractionPipeline:
             print(f"• Output RGBA size: {output_size:.1f} MB")
             print(f"• Compression ratio: {output_size/svs_size:.2f}x")
             print(f"\n📁 FILES:")
-            print(f"• Final output: {output_path}")
-            print(f"• Tissue TIFF: {tissue_tiff_path}")
-            print(f"• Mask TIFF: {mask_tiff_path}")
+            print(files)
             print(f"\n🎨 OUTPUT FORMAT:")
             print(f"• RGBA pyramidal TIFF")
             print(f"• Transparent background")
@@ -195,15 +367,29 @@ class UnifiedTissueExtractionPipeline:
         except Exception as e:
             raise ValueError(f"Cannot parse GeoJSON file: {e}")
 
+    def _open_svs(self, svs_path: str) -> "pyvips.Image":
+        """Open the SVS file with pyvips, reusing the image already opened for it"""
+        if self._svs_img is None or self._svs_path != svs_path:
+            self._svs_img = pyvips.Image.new_from_file(svs_path, access="sequential")
+            self._svs_path = svs_path
+        return self._svs_img
+
+    def _vips_supports_compression(self, compression: str) -> bool:
+        """Check whether libvips' libtiff can write the given compression"""
+        try:
+            pyvips.Image.black(1, 1).tiffsave_buffer(compression=compression)
+            return True
+        except pyvips.Error:
+            return False
+
     def convert_svs_to_tiff(self, svs_path: str, output_tiff_path: str, 
                            progress: Progress, task_id) -> Tuple[int, int]:
         """
-        Convert SVS file to pyramidal TIFF using your exact working code
+        Convert SVS file to pyramidal TIFF with JPEG tiles
         """
         progress.update(task_id, description="Loading SVS file...")
         
-        # Your exact working code
-        img = pyvips.Image.new_from_file(svs_path, access="sequential")
+        img = self._open_svs(svs_path)
         
         progress.update(task_id, advance=50, description="Converting to pyramidal TIFF...")
         
@@ -222,107 +408,208 @@ class UnifiedTissueExtractionPipeline:
     def generate_pyramidal_mask(self, svs_path: str, geojson_path: str, 
                                output_mask_path: str, progress: Progress, task_id) -> None:
         """
-        Generate pyramidal mask - your exact pyramidal_mask.py code
+        Generate the pyramidal mask TIFF from the GeoJSON annotations
+        """
+        vips_img, tile_size = self.build_mask_image(svs_path, geojson_path, progress, task_id)
+        
+        progress.update(task_id, advance=20, description="Saving pyramidal mask...")
+        
+        # === 4. Save the mask as a pyramidal TIFF
+        # ZSTD when libtiff has it (the pip libvips wheels lack it), deflate otherwise
+        compression = "zstd" if self._vips_supports_compression("zstd") else "deflate"
+        vips_img.tiffsave(
+            output_mask_path,
+            bigtiff=True,
+            compression=compression,
+            level=1,
+            tile=True,
+            tile_width=int(tile_size),
+            tile_height=int(tile_size),
+            pyramid=True,
+        )
+        
+        progress.update(task_id, completed=100, description="Mask generation completed")
+
+    def build_mask_image(self, svs_path: str, geojson_path: str,
+                         progress: Progress, task_id) -> Tuple["pyvips.Image", int]:
+        """
+        Rasterize the GeoJSON annotations at the WSI full resolution as a lazy
+        pyvips image (255 for tissue, 0 for background), with the WSI tile size
         """
         progress.update(task_id, description="Opening WSI for dimensions...")
         
-        # === 1. Open the WSI to extract dimensions (your exact code)
-        wsi = openslide.OpenSlide(svs_path)
-        base_width, base_height = wsi.dimensions
-        tile_size = wsi.properties.get("openslide.tile-width", 512)
-        wsi.close()
+        # === 1. Read dimensions from the WSI header
+        img = self._open_svs(svs_path)
+        base_width, base_height = img.width, img.height
+        if img.get_typeof("openslide.tile-width") != 0:
+            tile_size = img.get("openslide.tile-width")
+        else:
+            tile_size = 512
         
         progress.update(task_id, advance=20, description="Loading GeoJSON annotations...")
         
-        # === 2. Load and transform GeoJSON to match full res (your exact code)
-        with open(geojson_path, "r") as f:
-            geojson = json.load(f)
-
-        geoms = [shape(f["geometry"]) for f in geojson["features"]]
+        # === 2. Load the GeoJSON rings (full resolution coordinates)
+        coords, starts = self._load_annotations(geojson_path)
+        
+        progress.update(task_id, advance=20, description="Rasterizing mask tiles...")
         
-        progress.update(task_id, advance=20, description="Creating full-resolution mask...")
+        # === 3. Rasterize the mask tile by tile
+        tile_size = int(tile_size)
+        vips_img = self.rasterize_mask(coords, starts, base_width, base_height, tile_size)
         
-        # === 3. Create full-resolution binary mask (your exact code)
-        mask = np.zeros((base_height, base_width), dtype=np.uint8)
-        mask_value = 255
+        progress.update(task_id, advance=30, description="Mask tiles rasterized")
+        
+        return vips_img, tile_size
 
-        for geom in geoms:
-            if geom.geom_type == "Polygon":
-                polygons = [np.array(geom.exterior.coords, np.int32)]
-            elif geom.geom_type == "MultiPolygon":
-                polygons = [np.array(p.exterior.coords, np.int32) for p in geom.geoms]
-            else:
-                continue
+    def _load_annotations(self, geojson_path: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read the exterior rings of the GeoJSON polygons as one (N, 2) array of
+        full resolution coordinates and the offsets where each ring starts,
+        reusing the rings already read from that file
+        """
+        if self._annotations is None or self._geojson_path != geojson_path:
+            with open(geojson_path, "r") as f:
+                geojson = json.load(f)
+            
+            rings = []
+            for feature in geojson["features"]:
+                geometry = feature["geometry"]
+                if geometry["type"] == "Polygon":
+                    rings.append(geometry["coordinates"][0])
+                elif geometry["type"] == "MultiPolygon":
+                    rings.extend(polygon[0] for polygon in geometry["coordinates"])
+            
+            ring_sizes = np.array([len(ring) for ring in rings], dtype=np.int64)
+            starts = np.concatenate(([0], np.cumsum(ring_sizes)))
+            # Positions may carry an altitude ([x, y, z]), only x and y are kept
+            coords = np.array(
+                [position[:2] for ring in rings for position in ring], dtype=np.float64
+            ).reshape(-1, 2)
+            self._annotations = (coords, starts)
+            self._geojson_path = geojson_path
+        return self._annotations
 
-            for poly in polygons:
-                cv2.fillPoly(mask, [poly], mask_value)
-        
-        progress.update(task_id, advance=30, description="Converting to pyvips format...")
+    def rasterize_mask(self, coords: np.ndarray, starts: np.ndarray, width: int, height: int,
+                       tile_size: int, scale_x: float = 1.0, scale_y: float = 1.0) -> "pyvips.Image":
+        """
+        Rasterize the rings (full resolution coordinates, scaled by scale_x and
+        scale_y) into a lazy width x height pyvips mask, 255 inside and 0 outside
+        """
+        if scale_x != 1.0 or scale_y != 1.0:
+            coords = coords * (scale_x, scale_y)
         
-        # === 4. Convert to pyvips (your exact code)
-        vips_img = pyvips.Image.new_from_memory(
-            mask.tobytes(), base_width, base_height, 1, format="uchar"
+        # Keep the vertices as flat x and y arrays with per-ring start offsets:
+        # bounding boxes and the edge table are then linear scans over them
+        xs = coords[:, 0].astype(np.int32)
+        ys = coords[:, 1].astype(np.int32)
+        bounds = (
+            np.minimum.reduceat(xs, starts[:-1]), np.minimum.reduceat(ys, starts[:-1]),
+            np.maximum.reduceat(xs, starts[:-1]), np.maximum.reduceat(ys, starts[:-1]),
         )
+        # Shapely builds all polygons in a single vectorized call
+        polygons = shapely.polygons(shapely.linearrings(
+            coords, indices=np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+        ))
+        edge_table = _build_edge_table(xs, ys, starts)
         
-        progress.update(task_id, advance=20, description="Saving pyramidal mask...")
+        # GEOS predicates are unreliable on invalid (e.g. self-intersecting)
+        # rings, so only valid polygons may mark a tile as fully covered
+        valid = shapely.is_valid(polygons)
         
-        # === 5. Save pyramidal TIFF with same pyramid logic (your exact code)
-        vips_img.tiffsave(
-            output_mask_path,
-            bigtiff=True,
-            compression="deflate",
-            tile=True,
-            tile_width=int(tile_size),
-            tile_height=int(tile_size),
-            pyramid=True,
-        )
+        # Only tiles crossed by a polygon boundary get their own buffer; empty
+        # and fully covered tiles share a constant image, so peak memory follows
+        # the annotation outlines rather than the slide area. Tiles are stored
+        # bit-packed (8 pixels per byte), their side a multiple of 64 pixels so
+        # rows are whole uint64 words.
+        raster_size = -(-tile_size // 64) * 64
+        packed_width = raster_size // 8
+        tree = shapely.STRtree(shapely.box(*bounds))
+        n_cols = -(-width // raster_size)
+        n_rows = -(-height // raster_size)
+        empty_tile = pyvips.Image.black(packed_width, raster_size)
+        full_tile = empty_tile.new_from_image(0xFF)
+
+        tiles = []
+        for y in range(0, n_rows * raster_size, raster_size):
+            for x in range(0, n_cols * raster_size, raster_size):
+                tile_box = shapely.box(x, y, x + raster_size, y + raster_size)
+                hits = tree.query(tile_box)
+                if len(hits) == 0:
+                    tiles.append(empty_tile)
+                    continue
+                valid_hits = hits[valid[hits]]
+                if shapely.within(tile_box, polygons[valid_hits]).any():
+                    tiles.append(full_tile)
+                    continue
+
+                tile = np.zeros((raster_size, raster_size // 64), dtype=np.uint64)
+                _scanline_fill(*edge_table, hits, x, y, tile)
+                tile_bytes = tile.astype("<u8", copy=False).view(np.uint8)
+                tiles.append(pyvips.Image.new_from_memory(
+                    tile_bytes.data, packed_width, raster_size, 1, format="uchar"
+                ))
         
-        progress.update(task_id, completed=100, description="Mask generation completed")
+        # Assemble the tile grid lazily in pyvips and unpack it on demand: a
+        # lookup table maps each byte to its 8 pixels as 8 bands (255 for
+        # tissue, 0 for background), which are then unfolded side by side
+        packed = pyvips.Image.arrayjoin(tiles, across=n_cols)
+        
+        # Downstream reads come as narrow strips; cache whole rows of the packed
+        # grid (a few MB each) so the many-input arrayjoin is evaluated once per
+        # row instead of once per strip
+        packed = packed.tilecache(
+            tile_width=packed.width, tile_height=raster_size, max_tiles=4, threaded=True
+        )
+        byte_pixels = ((np.arange(256)[:, None] >> np.arange(8)) & 1).astype(np.uint8) * 255
+        unpack_lut = pyvips.Image.new_from_memory(byte_pixels.data, 256, 1, 8, format="uchar")
+        return packed.maplut(unpack_lut).bandunfold().crop(0, 0, width, height)
 
-    def convert_to_rgba(self, tissue_img: np.ndarray, mask_binary: np.ndarray) -> np.ndarray:
+    def convert_to_rgba(self, tissue_img: np.ndarray, alpha: np.ndarray) -> np.ndarray:
         """
-        Convert tissue image to RGBA with transparent background
-        (Your exact advanced_tissue_extractor.py code)
+        Convert tissue image to RGBA with transparent background, using a
+        precomputed alpha channel (opaque tissue, transparent background)
         """
         height, width = tissue_img.shape[:2]
         
-        # Handle different input formats
+        # 8-bit RGB, the usual tile: OpenCV interleaves the four channels in one pass
+        if tissue_img.ndim == 3 and tissue_img.shape[2] == 3 and tissue_img.dtype == np.uint8:
+            rgba_img = np.empty((height, width, 4), dtype=np.uint8)
+            cv2.mixChannels([tissue_img, alpha], [rgba_img], [0, 0, 1, 1, 2, 2, 3, 3])
+            return rgba_img
+        
+        # Handle different input formats (RGB sources are only read, never copied)
         if len(tissue_img.shape) == 2:
-            # Grayscale input - convert to RGB
-            rgb_img = np.stack([tissue_img, tissue_img, tissue_img], axis=2)
+            # Grayscale input - broadcast to RGB without materializing it
+            rgb_img = np.broadcast_to(tissue_img[:, :, None], (height, width, 3))
         elif tissue_img.shape[2] == 3:
             # RGB input
-            rgb_img = tissue_img.copy()
+            rgb_img = tissue_img
         elif tissue_img.shape[2] == 4:
             # Already RGBA - use RGB channels
             rgb_img = tissue_img[:, :, :3]
         else:
             raise ValueError(f"Unsupported image format: {tissue_img.shape}")
         
-        # Create RGBA image
-        rgba_img = np.zeros((height, width, 4), dtype=tissue_img.dtype)
+        # The alpha plane is 0/255, other sample types get their own full opacity
+        # (e.g. 65535 for uint16, 1.0 for floats)
+        if alpha.dtype != tissue_img.dtype:
+            if np.issubdtype(tissue_img.dtype, np.integer):
+                opaque = np.iinfo(tissue_img.dtype).max
+            else:
+                opaque = 1
+            alpha = np.where(alpha > 0, opaque, 0).astype(tissue_img.dtype)
         
-        # Copy RGB channels
-        rgba_img[:, :, :3] = rgb_img
-        
-        # Set alpha channel based on mask
-        # Where mask is 1 (tissue), alpha = 255 (opaque)
-        # Where mask is 0 (background), alpha = 0 (transparent)
-        if tissue_img.dtype == np.uint8:
-            rgba_img[:, :, 3] = mask_binary * 255
-        elif tissue_img.dtype == np.uint16:
-            rgba_img[:, :, 3] = mask_binary * 65535
-        else:
-            rgba_img[:, :, 3] = mask_binary.astype(tissue_img.dtype)
+        # Write RGB and alpha into the RGBA image in a single pass
+        rgba_img = np.empty((height, width, 4), dtype=tissue_img.dtype)
+        np.concatenate([rgb_img, alpha[:, :, None]], axis=2, out=rgba_img)
         
         return rgba_img
 
     def parse_level_selection(self, levels_str: str, max_levels: int) -> list:
         """
         Parse level selection string into list of level indices
-        (Your exact advanced_tissue_extractor.py code)
         """
-        selected = []
+        selected = [np.empty(0, dtype=np.int64)]
         
         for part in levels_str.split(','):
             part = part.strip()
@@ -330,39 +617,284 @@ class UnifiedTissueExtractionPipeline:
             if '-' in part:
                 # Range specification (e.g., "0-3")
                 start, end = map(int, part.split('-'))
-                selected.extend(range(start, min(end + 1, max_levels)))
+                selected.append(np.arange(start, min(end + 1, max_levels)))
             else:
                 # Single level (e.g., "0")
-                level = int(part)
-                if level < max_levels:
-                    selected.append(level)
+                selected.append(np.array([int(part)]))
+        
+        # Remove duplicates, sort and drop levels beyond the pyramid in one pass
+        levels = np.unique(np.concatenate(selected))
+        return levels[levels < max_levels].tolist()
+
+    def _map_ordered(self, func, items, max_workers: int):
+        """
+        Apply func to every argument tuple of items in a thread pool, yielding the
+        results in order while keeping only a few tasks in flight
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, *item))
+                if len(pending) >= 4 * max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def iter_rgba_tiles(self, tissue_vips: "pyvips.Image", mask_vips: "pyvips.Image",
+                        mask_threshold: int, tile_size: int, encoder=None):
+        """
+        Yield the RGBA tiles of one pyramid level in row-major order, reading
+        only one tile of tissue and mask at a time through pyvips regions.
+        Tiles are built in worker threads, and also compressed there into bytes
+        when an encoder is given.
+        """
+        # Read the image sizes once, every pyvips attribute access is a library call
+        width, height, tissue_bands = tissue_vips.width, tissue_vips.height, tissue_vips.bands
+        mask_width, mask_height, mask_bands = mask_vips.width, mask_vips.height, mask_vips.bands
+        
+        # Tiles must be written in raster order, so keep two rows of decoded
+        # tiles cached: source tiles straddling two output rows (the mask and
+        # tissue grids rarely line up) are then decoded once instead of twice
+        tissue_cached = tissue_vips.tilecache(
+            tile_width=tile_size, tile_height=tile_size,
+            max_tiles=2 * (-(-width // tile_size) + 1), threaded=True
+        )
+        mask_cached = mask_vips.tilecache(
+            tile_width=tile_size, tile_height=tile_size,
+            max_tiles=2 * (-(-mask_width // tile_size) + 1), threaded=True
+        )
+        scale_x = mask_width / width
+        scale_y = mask_height / height
+        
+        # A mask larger than the tissue by a whole factor is subsampled with a
+        # strided view, any other size mismatch is resized
+        step_x, step_y = mask_width // width, mask_height // height
+        integer_steps = (step_x * width, step_y * height) == (mask_width, mask_height)
+        
+        # Tiles entirely outside the tissue are all transparent and identical, so
+        # they are built (and encoded) once; tiles entirely inside get a constant
+        # opaque alpha instead of thresholding
+        transparent_tile = np.zeros((tile_size, tile_size, 4), dtype=np.uint8)
+        transparent_bytes = encoder(transparent_tile) if encoder is not None else None
+        opaque_alpha = np.full((tile_size, tile_size), 255, dtype=np.uint8)
+        
+        # pyvips regions cannot be shared between threads, each worker opens its own
+        worker = threading.local()
+        
+        def build_tile(x: int, y: int):
+            if not hasattr(worker, "tissue_region"):
+                worker.tissue_region = pyvips.Region.new(tissue_cached)
+                worker.mask_region = pyvips.Region.new(mask_cached)
+            
+            w = min(tile_size, width - x)
+            h = min(tile_size, height - y)
+            
+            # Fetch the matching mask area, which may have a different size
+            mask_x, mask_y = int(x * scale_x), int(y * scale_y)
+            mask_w = max(1, min(mask_width, int(np.ceil((x + w) * scale_x))) - mask_x)
+            mask_h = max(1, min(mask_height, int(np.ceil((y + h) * scale_y))) - mask_y)
+            mask_tile = np.frombuffer(
+                worker.mask_region.fetch(mask_x, mask_y, mask_w, mask_h), dtype=np.uint8
+            ).reshape(mask_h, mask_w, mask_bands)
+            
+            # Process mask
+            if mask_bands > 1:
+                mask_tile = cv2.extractChannel(mask_tile, 0)  # Use first channel
+            else:
+                mask_tile = mask_tile.reshape(mask_h, mask_w)
+            
+            # Resize mask if dimensions don't match
+            if mask_tile.shape != (h, w):
+                if integer_steps:
+                    mask_tile = mask_tile[::step_y, ::step_x]
+                else:
+                    mask_tile = cv2.resize(
+                        np.ascontiguousarray(mask_tile),
+                        (w, h),
+                        interpolation=cv2.INTER_NEAREST
+                    )
+            
+            # Background tiles need neither the tissue pixels nor any composing
+            mask_min, mask_max = cv2.minMaxLoc(mask_tile)[:2]
+            if mask_max <= mask_threshold:
+                if encoder is None:
+                    return transparent_tile[:h, :w]
+                return transparent_bytes
+            
+            tissue_tile = np.frombuffer(
+                worker.tissue_region.fetch(x, y, w, h), dtype=np.uint8
+            ).reshape(h, w, tissue_bands)
+            
+            if mask_min > mask_threshold:
+                alpha = opaque_alpha[:h, :w]
+            else:
+                # Threshold the mask straight into the alpha channel
+                # (255 for tissue, 0 for background) in one SIMD pass
+                _, alpha = cv2.threshold(mask_tile, mask_threshold, 255, cv2.THRESH_BINARY)
+            
+            # Convert to RGBA with transparent background
+            rgba_tile = self.convert_to_rgba(tissue_tile, alpha)
+            if encoder is None:
+                return rgba_tile
+            
+            # Encoded tiles are written as is, so edge tiles are zero-padded here
+            if (h, w) != (tile_size, tile_size):
+                padded = np.zeros((tile_size, tile_size, 4), dtype=rgba_tile.dtype)
+                padded[:h, :w] = rgba_tile
+                rgba_tile = padded
+            return encoder(rgba_tile)
         
-        # Remove duplicates and sort
-        return sorted(list(set(selected)))
+        tile_origins = (
+            (x, y) for y in range(0, height, tile_size) for x in range(0, width, tile_size)
+        )
+        yield from self._map_ordered(build_tile, tile_origins, min(os.cpu_count() or 1, 16))
 
-    def extract_tissue_rgba(self, tissue_path: str, mask_path: str, output_path: str,
-                           mask_threshold: int = 128) -> None:
+    def save_rgba_pyramid(self, tissue: "pyvips.Image", alpha: "pyvips.Image",
+                          output_path: str) -> None:
         """
-        Extract tissue using mask and output as RGBA with transparency
-        (Your exact advanced_tissue_extractor.py code with interactive level selection)
+        Join the tissue RGB bands with the alpha channel and save them as a pyramidal
+        RGBA TIFF, libvips building every reduced level from the full resolution one
+        """
+        # Keep only the RGB bands of the tissue
+        if tissue.bands == 1:
+            tissue = tissue.bandjoin([tissue, tissue])
+        elif tissue.bands >= 3:
+            tissue = tissue.extract_band(0, n=3)
+        else:
+            raise ValueError(f"Unsupported image format: {tissue.bands} bands")
+        
+        rgba = tissue.bandjoin(alpha).copy(interpretation="srgb")
+        
+        os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+        
+        compression = self.VIPS_COMPRESSIONS.get((self.compression or 'none').lower())
+        if compression is None:
+            raise ValueError(f"Unsupported compression for RGBA output: {self.compression}")
+        
+        save_options = {}
+        if compression in self.PREDICTOR_COMPRESSIONS:
+            save_options["predictor"] = "horizontal"
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            TimeElapsedColumn(),
+            console=self.console
+        ) as progress:
+            
+            task = progress.add_task("Writing RGBA pyramid...", total=100)
+            rgba.set_progress(True)
+            rgba.signal_connect("eval", lambda image, p: progress.update(task, completed=p.percent))
+            
+            rgba.tiffsave(
+                output_path,
+                tile=True,
+                tile_width=self.OUTPUT_TILE_SIZE,
+                tile_height=self.OUTPUT_TILE_SIZE,
+                pyramid=True,
+                compression=compression,
+                bigtiff=True,
+                **save_options
+            )
+            
+            progress.update(task, completed=100, description="Tissue extraction completed")
+
+    def extract_tissue_pyramid(self, tissue_path: str, mask_path: str, output_path: str,
+                               mask_threshold: int = 128) -> None:
+        """
+        Extract tissue using mask and output as RGBA with transparency, writing
+        all pyramid levels in one pass from the full resolution images
         """
         self.log_info("Starting RGBA tissue extraction...")
         
-        # Use pyvips to read pyramid levels since it created the files
         try:
             tissue_img = pyvips.Image.new_from_file(tissue_path)
-            tissue_levels = tissue_img.get('n-pages') if tissue_img.get_typeof('n-pages') != 0 else 1
-            tissue_shape = (tissue_img.height, tissue_img.width)
         except Exception as e:
             raise ValueError(f"Invalid tissue TIFF file: {e}")
         
         try:
             mask_img = pyvips.Image.new_from_file(mask_path)
-            mask_levels = mask_img.get('n-pages') if mask_img.get_typeof('n-pages') != 0 else 1
-            mask_shape = (mask_img.height, mask_img.width)
         except Exception as e:
             raise ValueError(f"Invalid mask TIFF file: {e}")
         
+        # Use first channel, resized if dimensions don't match
+        mask_img = mask_img[0]
+        if (mask_img.width, mask_img.height) != (tissue_img.width, tissue_img.height):
+            mask_img = mask_img.resize(
+                tissue_img.width / mask_img.width,
+                vscale=tissue_img.height / mask_img.height,
+                kernel="nearest"
+            )
+        
+        # 255 (opaque) for tissue, 0 (transparent) for background
+        alpha = mask_img > mask_threshold
+        
+        self.log_info(f"Writing RGBA pyramid ({tissue_img.width}x{tissue_img.height})")
+        self.save_rgba_pyramid(tissue_img, alpha, output_path)
+
+    def extract_tissue_direct(self, svs_path: str, geojson_path: str, output_path: str,
+                              mask_threshold: int = 128) -> None:
+        """
+        Extract tissue straight from the SVS and the GeoJSON annotations, without
+        intermediate TIFFs: the slide, the rasterized mask and the RGBA output form
+        a single libvips pipeline that only computes the tiles being saved
+        """
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            TimeElapsedColumn(),
+            console=self.console
+        ) as progress:
+            
+            task = progress.add_task("Generating mask...", total=100)
+            mask_img, _ = self.build_mask_image(svs_path, geojson_path, progress, task)
+            progress.update(task, completed=100, description="Mask rasterized")
+        
+        tissue_img = self._open_svs(svs_path)
+        
+        # 255 (opaque) for tissue, 0 (transparent) for background
+        alpha = mask_img > mask_threshold
+        
+        self.log_info(f"Writing RGBA pyramid ({tissue_img.width}x{tissue_img.height})")
+        self.save_rgba_pyramid(tissue_img, alpha, output_path)
+
+    def extract_tissue_rgba(self, tissue_path: str, mask_path: Optional[str], output_path: str,
+                           mask_threshold: int = 128, geojson_path: Optional[str] = None) -> None:
+        """
+        Extract tissue using mask and output as RGBA with transparency, with
+        interactive level selection.
+        Given the GeoJSON annotations, the mask of each level is rasterized from
+        them at that level's resolution and the mask pyramid is not read at all.
+        """
+        if mask_path is None and geojson_path is None:
+            raise ValueError("Either a mask TIFF or the GeoJSON annotations are required")
+        
+        self.log_info("Starting RGBA tissue extraction...")
+        
+        # Use pyvips to read pyramid levels since it created the files
+        try:
+            tissue_img = pyvips.Image.new_from_file(tissue_path)
+            tissue_levels = tissue_img.get('n-pages') if tissue_img.get_typeof('n-pages') != 0 else 1
+            tissue_shape = (tissue_img.height, tissue_img.width)
+        except Exception as e:
+            raise ValueError(f"Invalid tissue TIFF file: {e}")
+        
+        if geojson_path is not None:
+            # Masks rasterized from the annotations exist for every tissue level
+            mask_img = None
+            mask_levels = tissue_levels
+        else:
+            try:
+                mask_img = pyvips.Image.new_from_file(mask_path)
+                mask_levels = mask_img.get('n-pages') if mask_img.get_typeof('n-pages') != 0 else 1
+                mask_shape = (mask_img.height, mask_img.width)
+            except Exception as e:
+                raise ValueError(f"Invalid mask TIFF file: {e}")
+        
         self.log_info(f"Available levels - Tissue: {tissue_levels}, Mask: {mask_levels}")
         
         if tissue_levels != mask_levels:
@@ -394,6 +926,52 @@ class UnifiedTissueExtractionPipeline:
         # Create output directory
         os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
         
+        # Open every selected level up front so the loop below only reads pixels.
+        # The first pages are already open, the others are loaded one page each
+        # (n=1); the pages are fetched tile by tile from worker threads, so they
+        # keep random access rather than access="sequential".
+        tissue_pages = {
+            level: tissue_img if level == 0 else
+            pyvips.Image.new_from_file(tissue_path, page=level, n=1)
+            for level in selected_levels
+        }
+        
+        if geojson_path is not None:
+            # The annotations give an exact binary mask at any scale, cheaper than
+            # decoding a reduced mask page (whose averaged edges are re-thresholded)
+            coords, starts = self._load_annotations(geojson_path)
+            masks = {
+                level: self.rasterize_mask(
+                    coords, starts, tissue.width, tissue.height, self.OUTPUT_TILE_SIZE,
+                    scale_x=tissue.width / tissue_img.width,
+                    scale_y=tissue.height / tissue_img.height,
+                )
+                for level, tissue in tissue_pages.items()
+            }
+        else:
+            masks = {
+                level: mask_img if level == 0 else
+                pyvips.Image.new_from_file(mask_path, page=level, n=1)
+                for level in selected_levels
+            }
+        
+        level_pages = {level: (tissue_pages[level], masks[level]) for level in selected_levels}
+        level_shapes = {
+            level: (tissue.height, tissue.width) for level, tissue in tissue_pages.items()
+        }
+        
+        tile_size = self.OUTPUT_TILE_SIZE
+        
+        # Other compressions (e.g. JPEG) need tifffile to encode the tiles itself
+        compression = (self.compression or 'none').lower()
+        encoder = self.TILE_ENCODERS.get(compression)
+        predictor = compression in self.PREDICTOR_COMPRESSIONS
+        if encoder is not None and predictor:
+            # Pre-encoded tiles are written as is, so difference each sample
+            # with the same sample of the previous pixel before compressing
+            encode = encoder
+            encoder = lambda tile: encode(imagecodecs.delta_encode(tile, axis=-2))
+        
         # Use pyvips to read pyramid levels and tifffile to write
         with tifffile.TiffWriter(output_path, bigtiff=True) as writer:
             
@@ -412,48 +990,19 @@ class UnifiedTissueExtractionPipeline:
                 for i, level in enumerate(selected_levels):
                     progress.update(task, description=f"Processing level {level}...")
                     
-                    # Read images at current level using pyvips
-                    tissue_vips = pyvips.Image.new_from_file(tissue_path, page=level)
-                    mask_vips = pyvips.Image.new_from_file(mask_path, page=level)
-                    
-                    # Convert to numpy arrays
-                    tissue_img = np.ndarray(buffer=tissue_vips.write_to_memory(),
-                                          dtype=np.uint8,
-                                          shape=[tissue_vips.height, tissue_vips.width, tissue_vips.bands])
-                    
-                    mask_img = np.ndarray(buffer=mask_vips.write_to_memory(),
-                                        dtype=np.uint8,
-                                        shape=[mask_vips.height, mask_vips.width, mask_vips.bands])
-                    
-                    # Process mask
-                    if len(mask_img.shape) == 3:
-                        mask_img = mask_img[:, :, 0]  # Use first channel
-                    
-                    # Resize mask if dimensions don't match
-                    if mask_img.shape[:2] != tissue_img.shape[:2]:
-                        try:
-                            mask_img = cv2.resize(
-                                mask_img, 
-                                (tissue_img.shape[1], tissue_img.shape[0]),
-                                interpolation=cv2.INTER_NEAREST
-                            )
-                        except:
-                            mask_img = np.array(Image.fromarray(mask_img).resize(
-                                (tissue_img.shape[1], tissue_img.shape[0]),
-                                Image.NEAREST
-                            ))
-                    
-                    # Create binary mask (1 for tissue, 0 for background)
-                    mask_binary = (mask_img > mask_threshold).astype(np.uint8)
-                    
-                    # Convert to RGBA with transparent background
-                    rgba_extracted = self.convert_to_rgba(tissue_img, mask_binary)
+                    # Pixels of the current level are streamed tile by tile
+                    tissue_vips, mask_vips = level_pages[level]
                     
                     # Write level to output with RGBA photometric interpretation
                     writer.write(
-                        rgba_extracted,
+                        self.iter_rgba_tiles(tissue_vips, mask_vips, mask_threshold,
+                                             tile_size, encoder),
+                        shape=(*level_shapes[level], 4),
+                        dtype=np.uint8,
+                        tile=(tile_size, tile_size),
                         subfiletype=1 if level > 0 or level != selected_levels[0] else 0,
                         compression=self.compression,
+                        predictor=predictor,
                         photometric='rgb',
                         extrasamples=[1]    # 1 = associated alpha (transparency)
                     )
@@ -482,15 +1031,40 @@ class UnifiedTissueExtractionPipeline:
             self.log_error(f"Input validation failed: {e}")
             return
         
+        # Intermediate files that would be deleted anyway are not written at all:
+        # the three stages run as one pipeline (level selection reads the
+        # intermediate pyramids, so it keeps the staged pipeline)
+        if not self.keep_intermediates and not self.select_levels:
+            self.log_info(f"Input SVS: {svs_path}")
+            self.log_info(f"Input GeoJSON: {geojson_path}")
+            self.log_info(f"Final output: {output_path}")
+            self.log_info("Extracting tissue without intermediate files...")
+            try:
+                self.extract_tissue_direct(svs_path, geojson_path, output_path)
+                self.log_success("Tissue extraction completed")
+            except Exception as e:
+                self.log_error(f"Tissue extraction failed: {e}")
+                return
+            
+            total_time = time.time() - start_time
+            svs_size = os.path.getsize(svs_path) / (1024 * 1024)  # MB
+            output_size = os.path.getsize(output_path) / (1024 * 1024)  # MB
+            self.print_summary(total_time, svs_size, output_size, output_path)
+            return
+        
         # Setup temporary directory
         if temp_dir is None:
             temp_dir = tempfile.mkdtemp(prefix="tissue_pipeline_")
         else:
             os.makedirs(temp_dir, exist_ok=True)
         
-        # Define intermediate file paths
+        # Define intermediate file paths; level selection rasterizes the mask of
+        # each level from the annotations, so it needs no mask pyramid
         tissue_tiff_path = os.path.join(temp_dir, "tissue_pyramidal.tiff")
-        mask_tiff_path = os.path.join(temp_dir, "mask_pyramidal.tiff")
+        if self.select_levels:
+            mask_tiff_path = None
+        else:
+            mask_tiff_path = os.path.join(temp_dir, "mask_pyramidal.tiff")
         
         self.log_info(f"Working directory: {temp_dir}")
         self.log_info(f"Input SVS: {svs_path}")
@@ -520,23 +1094,32 @@ class UnifiedTissueExtractionPipeline:
                 return
             
             # Stage 2: Generate pyramidal mask
-            task2 = progress.add_task("Generating pyramidal mask...", total=100)
-            try:
-                self.generate_pyramidal_mask(
-                    svs_path, geojson_path, mask_tiff_path, progress, task2
-                )
-                self.log_success("Pyramidal mask generated")
-                self.log_info(f"Mask TIFF: {mask_tiff_path}")
-            except Exception as e:
-                self.log_error(f"Mask generation failed: {e}")
-                return
+            if mask_tiff_path is None:
+                self.log_info("Mask levels will be rasterized from the annotations during extraction")
+            else:
+                task2 = progress.add_task("Generating pyramidal mask...", total=100)
+                try:
+                    self.generate_pyramidal_mask(
+                        svs_path, geojson_path, mask_tiff_path, progress, task2
+                    )
+                    self.log_success("Pyramidal mask generated")
+                    self.log_info(f"Mask TIFF: {mask_tiff_path}")
+                except Exception as e:
+                    self.log_error(f"Mask generation failed: {e}")
+                    return
         
-        # Stage 3: Extract tissue with RGBA transparency (your exact code)
+        # Stage 3: Extract tissue with RGBA transparency
         self.log_info("Starting tissue extraction phase...")
         try:
-            self.extract_tissue_rgba(
-                tissue_tiff_path, mask_tiff_path, output_path
-            )
+            if self.select_levels:
+                self.extract_tissue_rgba(
+                    tissue_tiff_path, mask_tiff_path, output_path,
+                    geojson_path=geojson_path
+                )
+            else:
+                self.extract_tissue_pyramid(
+                    tissue_tiff_path, mask_tiff_path, output_path
+                )
             self.log_success("Tissue extraction completed")
         except Exception as e:
             self.log_error(f"Tissue extraction failed: {e}")
@@ -556,7 +1139,8 @@ class UnifiedTissueExtractionPipeline:
         if not self.keep_intermediates:
             try:
                 os.remove(tissue_tiff_path)
-                os.remove(mask_tiff_path)
+                if mask_tiff_path is not None:
+                    os.remove(mask_tiff_path)
                 os.rmdir(temp_dir)
                 self.log_info("Intermediate files cleaned up")
             except Exception as e:
@@ -571,8 +1155,10 @@ def main():
         print("Usage: python unified_tissue_pipeline.py <svs_file> <geojson_file> <output_rgba_tiff> [options]")
         print("\nOptions:")
         print("  --temp-dir <path>           Directory for intermediate files")
-        print("  --no-keep-intermediates     Delete intermediate files after completion")
-        print("  --compression <type>        Output compression (default: lzw)")
+        print("  --no-keep-intermediates     Run without writing intermediate files")
+        print("  --compression <type>        Output compression: none, lzw, deflate, zstd")
+        print("                              (+ lzma with --select-levels; default: zstd)")
+        print("  --select-levels             Choose which pyramid levels to write")
         print("\nExample:")
         print("python unified_tissue_pipeline.py tissue.svs annotations.geojson extracted_tissue.tiff")
         print("python unified_tissue_pipeline.py tissue.svs mask.geojson output.tiff --temp-dir ./temp")
@@ -580,7 +1166,7 @@ def main():
         print("1. Convert SVS → Pyramidal TIFF")
         print("2. Generate pyramidal mask from GeoJSON")
         print("3. Extract tissue → RGBA TIFF with transparency")
-        print("\nNote: During tissue extraction, you'll be prompted to select which pyramid levels to process.")
+        print("\nNote: With --select-levels, you'll be prompted to select which pyramid levels to process.")
         sys.exit(1)
     
     svs_path = sys.argv[1]
@@ -590,7 +1176,8 @@ def main():
     # Parse optional arguments
     temp_dir = None
     keep_intermediates = True
-    compression = 'lzw'
+    compression = 'zstd'
+    select_levels = False
     
     i = 4
     while i < len(sys.argv):
@@ -603,13 +1190,28 @@ def main():
         elif sys.argv[i] == '--compression' and i + 1 < len(sys.argv):
             compression = sys.argv[i + 1]
             i += 2
+        elif sys.argv[i] == '--select-levels':
+            select_levels = True
+            i += 1
         else:
             i += 1
     
+    # The alpha channel rules out JPEG; the tifffile writer of --select-levels
+    # has its own set of codecs
+    if select_levels:
+        supported = UnifiedTissueExtractionPipeline.TILE_ENCODERS
+    else:
+        supported = UnifiedTissueExtractionPipeline.VIPS_COMPRESSIONS
+    if compression.lower() not in supported:
+        print(f"❌ Unsupported compression for RGBA output: {compression} "
+              f"(choose from: {', '.join(supported)})")
+        sys.exit(1)
+    
     try:
         pipeline = UnifiedTissueExtractionPipeline(
             keep_intermediates=keep_intermediates,
-            compression=compression
+            compression=compression,
+            select_levels=select_levels
         )
         pipeline.run_pipeline(svs_path, geojson_path, output_path, temp_dir)
     except KeyboardInterrupt: